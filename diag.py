@@ -16,8 +16,10 @@ What it does:
 
 from __future__ import annotations
 import io
+import html
 import base64
-from datetime import datetime, date, timedelta
+import threading
+from datetime import date
 from textwrap import dedent
 
 import numpy as np
@@ -25,6 +27,11 @@ import pandas as pd
 import streamlit as st
 import altair as alt
 
+try:  # optional: JIT-fused filter mask for large uploads (numpy is used otherwise)
+    from numba import njit, prange, types
+except ImportError:
+    njit = None
+
 # ----------------------------------------------------
 # Page / Theme
 # ----------------------------------------------------
@@ -67,12 +74,16 @@ st.markdown(FONT_CSS, unsafe_allow_html=True)
 # ----------------------------------------------------
 # Assets (logo optional)
 # ----------------------------------------------------
-logo_b64 = None
-try:
-    with open("cj.jpg", "rb") as f:
-        logo_b64 = base64.b64encode(f.read()).decode("utf-8")
-except Exception:
-    pass
+@st.cache_data(show_spinner=False)
+def load_logo_b64() -> str | None:
+    # read + encode once per process instead of on every rerun
+    try:
+        with open("cj.jpg", "rb") as f:
+            return base64.b64encode(f.read()).decode("utf-8")
+    except Exception:
+        return None
+
+logo_b64 = load_logo_b64()
 
 # ----------------------------------------------------
 # Sample Data (embedded)
@@ -214,54 +225,193 @@ def _std_columns(df: pd.DataFrame) -> pd.DataFrame:
         raise ValueError(f"Missing columns: {sorted(miss)}")
     return df
 
-def _parse_date_any(s: str) -> date:
-    s = str(s).strip()
-    for fmt in ("%Y.%m.%d","%Y-%m-%d","%Y/%m/%d","%m/%d/%Y","%d/%m/%Y"):
-        try:
-            return datetime.strptime(s, fmt).date()
-        except Exception:
-            pass
+_DATE_FMTS = ("%Y.%m.%d","%Y-%m-%d","%Y/%m/%d","%m/%d/%Y","%d/%m/%Y")
+
+def _parse_date_col(col: pd.Series) -> pd.Series:
+    # each format is tried in order on the rows still unparsed, then Excel serial numbers;
+    # results are truncated to midnight so Test_Date keeps whole-day semantics
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.dt.normalize()
+    raw = col.astype(str).str.strip()
+    out = pd.Series(pd.NaT, index=col.index, dtype='datetime64[ns]')
+    for fmt in _DATE_FMTS:
+        rest = out.isna()
+        if not rest.any():
+            break
+        out = out.combine_first(pd.to_datetime(raw[rest], format=fmt, errors='coerce'))
     # excel serial?
-    try:
-        base = datetime(1899,12,30)
-        return (base + timedelta(days=float(s))).date()
-    except Exception:
-        raise ValueError(f"Failed to parse date: {s}")
-
-def _to_float_ct(x):
-    s = str(x).strip().lower()
-    if s in {"", "na", "none", "nan", "no ct", "n/a"}:
-        return np.nan
-    try:
-        return float(s)
-    except Exception:
-        return np.nan
-
-@st.cache_data(show_spinner=False)
-def load_sample() -> pd.DataFrame:
+    rest = out.isna()
+    if rest.any():
+        days = pd.to_numeric(raw[rest], errors='coerce')
+        out = out.combine_first(pd.Timestamp(1899, 12, 30) + pd.to_timedelta(days, unit='D'))
+    bad = out.isna()
+    if bad.any():
+        raise ValueError(f"Failed to parse date: {raw[bad].iloc[0]}")
+    return out.dt.normalize()
+
+# low-cardinality text columns stored as pandas categoricals (sorted categories)
+_CAT_COLS = ['Specie','Farm_Name','Disease']
+# canonical Result values; Result categories always start with these, so codes 0/1/2 are fixed
+RESULTS = ['Positive','Negative','Re-analysis']
+# known CSV column types (header spelled with spaces or underscores), so read_csv skips inference;
+# Sample ID is left to inference so purely numeric IDs stay integers and sort numerically
+_CSV_DTYPES = {'Specie': 'category', 'Farm Name': 'category', 'Disease': 'category',
+               'Test Date': 'string', 'CT Value': 'string', 'Result': 'string'}
+_CSV_DTYPES.update({k.replace(' ', '_'): v for k, v in _CSV_DTYPES.items()})
+# detail tables longer than this are streamed row by row into the HTML report
+REPORT_STREAM_ROWS = 5000
+# frames at least this long are masked by the numba kernel when numba is installed
+JIT_MASK_ROWS = 200_000
+
+_NO_CT = {"", "na", "none", "nan", "no ct", "n/a"}
+
+_RESULT_CANON = {'positive':'Positive','negative':'Negative','re-analysis':'Re-analysis','re analysis':'Re-analysis'}
+
+def _result_categorical(col: pd.Series) -> pd.Series:
+    # normalize with one lowercase + one map; unrecognised values keep their Title-cased text
+    raw = col.astype(str).str.strip()
+    out = raw.str.lower().map(_RESULT_CANON)
+    miss = out.isna()
+    if miss.any():
+        out[miss] = raw[miss].str.title()
+    # RESULTS first (fixed codes), then any other values found in the data
+    extra = sorted(set(out.dropna().unique()) - set(RESULTS))
+    return out.astype(pd.CategoricalDtype(RESULTS + extra))
+
+def _result_counts(df: pd.DataFrame) -> tuple[int, int, int]:
+    # (positive, negative, re-analysis) in one bincount over the Result codes
+    codes = df['Result'].cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(RESULTS))
+    return tuple(int(c) for c in counts[:len(RESULTS)])
+
+def _to_float_ct_col(col: pd.Series) -> pd.Series:
+    # CT text -> float ('No Ct' etc. -> NaN): one string pass + one numeric parse for the whole column
+    s = col.astype(str).str.strip().str.lower()
+    s = s.mask(s.isin(_NO_CT))
+    return pd.to_numeric(s, errors='coerce')
+
+@st.cache_resource(show_spinner=False)
+def _build_sample() -> pd.DataFrame:
+    # RAW is constant: parse it once per process and share the frame across sessions
+    # (Streamlit re-executes this script on every rerun, so a plain module constant would not stick)
     df = pd.read_csv(io.StringIO(RAW), sep='\t')
     df = _std_columns(df)
-    df['Test_Date'] = df['Test_Date'].astype(str).str.replace('.', '-', regex=False)
-    df['Test_Date'] = df['Test_Date'].apply(lambda x: datetime.strptime(x, '%Y-%m-%d').date())
-    df['CT_Value_Num'] = df['CT_Value'].apply(_to_float_ct)
-    df['Result'] = (df['Result'].astype(str).str.strip().str.title()
-                        .replace({'Re-Analysis':'Re-analysis','Re-Analysis':'Re-analysis'}))
-    df['is_positive'] = df['Result'].eq('Positive')
-    return df.sort_values(['Test_Date','Farm_Name','Disease','Sample_ID']).reset_index(drop=True)
+    df['Test_Date'] = pd.to_datetime(df['Test_Date'].astype(str), format='%Y.%m.%d')
+    df['CT_Value_Num'] = _to_float_ct_col(df['CT_Value']).astype('float32')
+    df['number'] = pd.to_numeric(df['number'], downcast='integer')
+    df['Result'] = _result_categorical(df['Result'])
+    for c in _CAT_COLS:
+        df[c] = df[c].astype('category')
+    return df
+
+def load_sample() -> pd.DataFrame:
+    return _build_sample().copy(deep=False)
+
+def _read_excel(uploaded) -> pd.DataFrame:
+    # calamine (python-calamine) parses xlsx/xls several times faster than openpyxl/xlrd
+    try:
+        return pd.read_excel(uploaded, engine='calamine')
+    except ImportError:
+        uploaded.seek(0)
+        return pd.read_excel(uploaded)
 
 @st.cache_data(show_spinner=False)
 def read_any_file(uploaded) -> pd.DataFrame:
     if uploaded.name.lower().endswith('.csv'):
-        df = pd.read_csv(uploaded)
+        df = pd.read_csv(uploaded, dtype=_CSV_DTYPES)
     else:
-        df = pd.read_excel(uploaded)
+        df = _read_excel(uploaded)
     df = _std_columns(df)
-    df['Test_Date'] = df['Test_Date'].apply(_parse_date_any)
-    df['CT_Value_Num'] = df['CT_Value'].apply(_to_float_ct)
-    df['Result'] = (df['Result'].astype(str).str.strip().str.title()
-                        .replace({'Re-Analysis':'Re-analysis','Re-Analysis':'Re-analysis'}))
-    df['is_positive'] = df['Result'].eq('Positive')
-    return df.sort_values(['Test_Date','Farm_Name','Disease','Sample_ID']).reset_index(drop=True)
+    df['Test_Date'] = _parse_date_col(df['Test_Date'])
+    df['CT_Value_Num'] = _to_float_ct_col(df['CT_Value']).astype('float32')
+    if pd.api.types.is_integer_dtype(df['number']):  # uploads may carry non-numeric row labels
+        df['number'] = pd.to_numeric(df['number'], downcast='integer')
+    df['Result'] = _result_categorical(df['Result'])
+    for c in _CAT_COLS:
+        df[c] = df[c].astype('category')
+    return df
+
+# ----------------------------------------------------
+# Filtering (memoized on the selections)
+# ----------------------------------------------------
+# `src_key` identifies the loaded dataset ("sample" or the upload's file id), so the
+# source frame itself is passed as an unhashed `_df` and hashing stays O(1).
+# max_entries bounds how many filtered frames / chart specs are kept per process.
+ALL = "All"
+
+def _cat_code(col: pd.Series, value: str) -> int:
+    # code of `value` in a categorical column; -2 if absent (never matches, NaN is -1)
+    idx = col.cat.categories.get_indexer([value])[0]
+    return int(idx) if idx >= 0 else -2
+
+@st.cache_resource(show_spinner=False)
+def _mask_kernel():
+    # compiled once per process; Streamlit's reruns would otherwise re-decorate (and recompile) it.
+    # The explicit signatures (int8/int16 category codes) compile eagerly here rather than on a
+    # user's first large filter; other code widths take the numpy path in filter_df.
+    if njit is None:
+        return None
+    # inputs are declared readonly: pandas' copy-on-write hands out read-only views (writable ones convert)
+    ro = lambda t: types.Array(t, 1, 'A', readonly=True)
+    sigs = [types.Array(types.bool_, 1, 'C')(ro(types.int64), ro(d), ro(r), types.int64, types.int64,
+                                              types.int64, types.int64)
+            for d in (types.int8, types.int16) for r in (types.int8, types.int16)]
+
+    @njit(sigs, parallel=True, boundscheck=False)
+    def kernel(ts, dcodes, rcodes, lo, hi, d_sel, r_sel):
+        # d_sel / r_sel == -1 means ALL
+        out = np.empty(ts.size, np.bool_)
+        for i in prange(ts.size):
+            out[i] = ((ts[i] >= lo) and (ts[i] < hi)
+                      and (d_sel == -1 or dcodes[i] == d_sel)
+                      and (r_sel == -1 or rcodes[i] == r_sel))
+        return out
+
+    # Session threads share this kernel, and numba's fallback `workqueue` threading layer
+    # aborts the process on concurrent parallel launches, so calls are serialized.
+    lock = threading.Lock()
+
+    def run(*args):
+        with lock:
+            return kernel(*args)
+    return run
+
+def subset_df(df: pd.DataFrame, specie: str, farm: str = ALL) -> pd.DataFrame:
+    # not memoized: a cache hit would unpickle a full copy, while ALL/ALL is free as-is
+    df = df if specie == ALL else df[df["Specie"] == specie]
+    return df if farm == ALL else df[df["Farm_Name"] == farm]
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def filter_df(src_key: str, _df: pd.DataFrame, specie: str, farm: str, disease: str, result: str,
+              d_start: date, d_end: date) -> pd.DataFrame:
+    df2 = subset_df(_df, specie, farm)
+    # one boolean vector over the raw datetime64 values and category codes;
+    # d_end is inclusive of the whole day, ALL selections skip their compare
+    ts = df2["Test_Date"].to_numpy()
+    lo, hi = np.datetime64(d_start), np.datetime64(d_end) + np.timedelta64(1, 'D')
+    kernel = _mask_kernel() if len(df2) >= JIT_MASK_ROWS else None
+    dcodes, rcodes = df2["Disease"].cat.codes.to_numpy(), df2["Result"].cat.codes.to_numpy()
+    if kernel is not None and dcodes.dtype.itemsize <= 2 and rcodes.dtype.itemsize <= 2:
+        # same mask fused into one parallel pass over the int64 timestamps and codes
+        d_sel = -1 if disease == ALL else _cat_code(df2["Disease"], disease)
+        r_sel = -1 if result == ALL else _cat_code(df2["Result"], result)
+        mask = kernel(ts.view('i8'), dcodes, rcodes,
+                      lo.astype(ts.dtype).astype(np.int64), hi.astype(ts.dtype).astype(np.int64), d_sel, r_sel)
+        return df2.loc[mask].copy()
+    mask = ts >= lo
+    mask &= ts < hi
+    if disease != ALL:
+        mask &= dcodes == _cat_code(df2["Disease"], disease)
+    if result != ALL:
+        mask &= rcodes == _cat_code(df2["Result"], result)
+    return df2.loc[mask].copy()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def compute_kpis(fdf_key: tuple, _fdf: pd.DataFrame) -> dict:
+    total = len(_fdf)
+    pos, neg, rea = _result_counts(_fdf)
+    rate = (pos / total * 100.0) if total else 0.0
+    return {"total": total, "pos": pos, "neg": neg, "rea": rea, "rate": rate}
 
 # ----------------------------------------------------
 # Header
@@ -292,61 +442,60 @@ st.divider()
 # ----------------------------------------------------
 up = st.file_uploader("Upload data (CSV/XLSX). Leave empty to use the embedded sample.", type=["csv","xlsx","xls"])
 DF = read_any_file(up) if up is not None else load_sample()
+SRC_KEY = up.file_id if up is not None else "sample"
 
 # ----------------------------------------------------
 # Cascading combo boxes (Specie -> Farm -> Disease -> Result -> Period)
 # ----------------------------------------------------
 st.subheader("Selections")
 
-ALL = "All"
-
 # 1) Specie
-specie_opts = [ALL] + sorted(DF["Specie"].unique().tolist())
+specie_opts = [ALL] + DF["Specie"].cat.categories.tolist()
 specie = st.selectbox("Specie", specie_opts, index=0)
 
-df1 = DF if specie == ALL else DF[DF["Specie"] == specie]
+df1 = subset_df(DF, specie)
 
 # 2) Farm (single select via combo box)
 farm_opts = [ALL] + sorted(df1["Farm_Name"].unique().tolist())
 farm = st.selectbox("Farm", farm_opts, index=0)
 
-df2 = df1 if farm == ALL else df1[df1["Farm_Name"] == farm]
+df2 = subset_df(DF, specie, farm)
 
 # 3) Disease (narrowed by previous)
 disease_opts = [ALL] + sorted(df2["Disease"].unique().tolist())
 disease = st.selectbox("Disease", disease_opts, index=0)
 
 # 4) Result
-result = st.selectbox("Result", [ALL, "Positive", "Negative", "Re-analysis"], index=0)
+result = st.selectbox("Result", [ALL] + RESULTS, index=0)
 
 # 5) Period (auto range based on current candidate df2)
-dmin, dmax = df2["Test_Date"].min(), df2["Test_Date"].max()
+dmin, dmax = df2["Test_Date"].min().date(), df2["Test_Date"].max().date()
 date_range = st.date_input("Period", (dmin, dmax))
 if isinstance(date_range, tuple):
     d_start, d_end = date_range
 else:
     d_start, d_end = dmin, dmax
 
-# Build filtered dataframe safely (date-type safe)
-TD = pd.to_datetime(df2["Test_Date"]).dt.date
-mask = (TD >= d_start) & (TD <= d_end)
-if disease != ALL:
-    mask &= df2["Disease"].eq(disease)
-if result != ALL:
-    mask &= df2["Result"].eq(result)
+# Build filtered dataframe (cached per selection)
+fdf = filter_df(SRC_KEY, DF, specie, farm, disease, result, d_start, d_end)
+FDF_KEY = (SRC_KEY, specie, farm, disease, result, d_start, d_end)
 
-fdf = df2.loc[mask].copy()
+# Display slice built once and shared by the report and the raw table; explicit column
+# types spare st.dataframe its per-rerun type inference on these columns.
+show_cols = ['number','Sample_ID','Specie','Farm_Name','Disease','Test_Date','CT_Value','Result']
+display_df = fdf.sort_values(['Test_Date','Farm_Name','Disease','Sample_ID'])[show_cols]
+COLUMN_CONFIG = {
+    'Test_Date': st.column_config.DateColumn('Test_Date'),
+    'CT_Value': st.column_config.TextColumn('CT_Value'),
+}
 
 # ----------------------------------------------------
 # KPIs
 # ----------------------------------------------------
 col1, col2, col3, col4, col5 = st.columns(5)
 
-total = len(fdf)
-pos = int(fdf['is_positive'].sum())
-neg = int((fdf['Result'] == 'Negative').sum())
-rea = int((fdf['Result'].str.lower() == 're-analysis').sum())
-rate = (pos / total * 100.0) if total else 0.0
+kpis = compute_kpis(FDF_KEY, fdf)
+total, pos, neg, rea, rate = kpis["total"], kpis["pos"], kpis["neg"], kpis["rea"], kpis["rate"]
 
 col1.metric("Total Tests", f"{total:,}")
 col2.metric("Positive", f"{pos:,}")
@@ -360,18 +509,20 @@ st.caption("Note: CT≲30 strong positive, 33–36 borderline (re-test). 'No Ct'
 # Overview Cards (for whichever farms remain in fdf)
 # ----------------------------------------------------
 st.subheader("Farms — Overview")
-farms = sorted(fdf['Farm_Name'].unique())
+# all farms' stats in two groupby passes (index is in sorted category order)
+farm_stats = (fdf.groupby('Farm_Name', observed=True)
+                 .agg(total=('Result', 'size'), last=('Test_Date', 'max'))
+                 .join(fdf.groupby(['Farm_Name', 'Result'], observed=True).size().unstack(fill_value=0)))
+farms = farm_stats.index.tolist()
 cols = st.columns(3)
 for i, fm in enumerate(farms):
-    sub = fdf[fdf['Farm_Name'] == fm]
-    if sub.empty:
-        continue
-    t = len(sub)
-    p = int(sub['is_positive'].sum())
-    n = int((sub['Result'] == 'Negative').sum())
-    r = int((sub['Result'].str.lower() == 're-analysis').sum())
+    row = farm_stats.loc[fm]
+    t = int(row['total'])
+    p = int(row.get('Positive', 0))
+    n = int(row.get('Negative', 0))
+    r = int(row.get('Re-analysis', 0))
     pr = (p / t * 100.0) if t else 0
-    last_date = sub['Test_Date'].max()
+    last_date = row['last'].date()
     with cols[i % 3]:
         st.markdown(
             f"""
@@ -392,46 +543,65 @@ for i, fm in enumerate(farms):
 # ----------------------------------------------------
 # Charts
 # ----------------------------------------------------
+# Specs are memoized on FDF_KEY (fdf itself is unhashed), so unchanged selections
+# skip rebuilding and serializing the Altair charts. Counts are aggregated in pandas
+# so only the small summary frames are embedded in the specs, not every fdf row.
+def _chart_spec(chart: alt.Chart) -> dict:
+    with alt.data_transformers.disable_max_rows():
+        spec = chart.to_dict()
+    spec.pop('config', None)  # altair's default-theme view size; st.altair_chart drops it too
+    return spec
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_chart1(fdf_key: tuple, _fdf: pd.DataFrame) -> dict:
+    c1_src = _fdf.groupby(['Specie','Result'], observed=True).size().reset_index(name='count')
+    return _chart_spec(alt.Chart(c1_src).mark_bar().encode(
+        x=alt.X('Specie:N', title='Specie'),
+        y=alt.Y('count:Q', title='Count'),
+        color=alt.Color('Result:N', legend=alt.Legend(title='Result')),
+        column=alt.Column('Result:N', header=alt.Header(labelOrient='bottom', title=None)),
+        tooltip=['Specie', 'Result', 'count']
+    ).properties(height=250))
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_chart2(fdf_key: tuple, _fdf: pd.DataFrame) -> dict:
+    c2_src = _fdf.groupby(['Disease','Result'], observed=True).size().reset_index(name='count')
+    return _chart_spec(alt.Chart(c2_src).mark_bar().encode(
+        x=alt.X('Disease:N', title='Disease'),
+        y=alt.Y('count:Q', title='Count'),
+        color=alt.Color('Result:N', legend=alt.Legend(title='Result')),
+        tooltip=['Disease', 'Result', 'count']
+    ).properties(height=250))
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def build_chart3(fdf_key: tuple, _fdf: pd.DataFrame) -> dict:
+    line_df = (_fdf['Result'].eq('Positive').groupby([_fdf['Test_Date'], _fdf['Disease']], observed=True)
+                   .sum().reset_index(name='Positive_Count'))
+    return _chart_spec(alt.Chart(line_df).mark_line(point=True).encode(
+        x=alt.X('Test_Date:T', title='Date'),
+        y=alt.Y('Positive_Count:Q', title='Positive (count)'),
+        color='Disease:N',
+        tooltip=['Test_Date:T','Disease:N','Positive_Count:Q']
+    ).properties(height=280))
+
 left, right = st.columns(2)
 with left:
     st.subheader("By Specie × Result")
     if not fdf.empty:
-        chart1 = alt.Chart(fdf).mark_bar().encode(
-            x=alt.X('Specie:N', title='Specie'),
-            y=alt.Y('count():Q', title='Count'),
-            color=alt.Color('Result:N', legend=alt.Legend(title='Result')),
-            column=alt.Column('Result:N', header=alt.Header(labelOrient='bottom', title=None)),
-            tooltip=['Specie', 'Result', 'count()']
-        ).properties(height=250)
-        st.altair_chart(chart1, use_container_width=True)
+        st.vega_lite_chart(build_chart1(FDF_KEY, fdf), use_container_width=True)
     else:
         st.info('No data')
 
 with right:
     st.subheader("By Disease × Result")
     if not fdf.empty:
-        tmp = fdf.copy()
-        tmp['Res2'] = tmp['Result'].replace({'Re-analysis':'Re-analysis'})
-        chart2 = alt.Chart(tmp).mark_bar().encode(
-            x=alt.X('Disease:N', title='Disease'),
-            y=alt.Y('count():Q', title='Count'),
-            color=alt.Color('Res2:N', legend=alt.Legend(title='Result')),
-            tooltip=['Disease', 'Res2', 'count()']
-        ).properties(height=250)
-        st.altair_chart(chart2, use_container_width=True)
+        st.vega_lite_chart(build_chart2(FDF_KEY, fdf), use_container_width=True)
     else:
         st.info('No data')
 
 st.subheader("Positive trend by Disease")
 if not fdf.empty:
-    line_df = fdf.groupby(['Test_Date','Disease'])['is_positive'].sum().reset_index(name='Positive_Count')
-    chart3 = alt.Chart(line_df).mark_line(point=True).encode(
-        x=alt.X('Test_Date:T', title='Date'),
-        y=alt.Y('Positive_Count:Q', title='Positive (count)'),
-        color='Disease:N',
-        tooltip=['Test_Date:T','Disease:N','Positive_Count:Q']
-    ).properties(height=280)
-    st.altair_chart(chart3, use_container_width=True)
+    st.vega_lite_chart(build_chart3(FDF_KEY, fdf), use_container_width=True)
 else:
     st.info('No data')
 
@@ -449,14 +619,16 @@ else:
 rep_farm = st.selectbox("Choose a farm for the report", options=farms, index=default_idx)
 
 if rep_farm:
-    rep = fdf[fdf['Farm_Name'] == rep_farm].copy()
+    rep = display_df[display_df['Farm_Name'] == rep_farm]
+    rep_pos, rep_neg, rep_rea = _result_counts(rep)
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Samples", f"{len(rep):,}")
-    c2.metric("Positive", int(rep['is_positive'].sum()))
-    c3.metric("Negative", int((rep['Result'] == 'Negative').sum()))
-    c4.metric("Re-analysis", int((rep['Result'].str.lower() == 're-analysis').sum()))
+    c2.metric("Positive", rep_pos)
+    c3.metric("Negative", rep_neg)
+    c4.metric("Re-analysis", rep_rea)
 
-    pivot = (rep.pivot_table(index='Disease', columns='Result', values='number', aggfunc='count', fill_value=0)
+    pivot = rep.groupby(['Disease','Result'], observed=True).size().unstack(fill_value=0)
+    pivot = (pivot.reindex(columns=RESULTS + [c for c in pivot.columns if c not in RESULTS], fill_value=0)
                 .reset_index().rename_axis(None, axis=1))
 
     st.write("By disease (summary)")
@@ -465,23 +637,38 @@ if rep_farm:
     view_cols = ['Sample_ID','Specie','Disease','Test_Date','CT_Value','Result']
     rep_view = rep.loc[:, view_cols].sort_values(['Disease','Test_Date','Sample_ID'])
     st.write("Details")
-    st.dataframe(rep_view, use_container_width=True, hide_index=True)
+    st.dataframe(rep_view, use_container_width=True, hide_index=True, column_config=COLUMN_CONFIG)
 
     # HTML report generator (English)
     def df_to_html_table(df: pd.DataFrame) -> str:
-        df2 = df.copy()
-        if 'Test_Date' in df2.columns:
-            df2['Test_Date'] = df2['Test_Date'].astype(str)
-        return df2.to_html(index=False, classes='tbl', border=0, justify='center')
+        # format dates while rendering rather than copying the frame into a str column
+        fmt = {'Test_Date': lambda d: d.strftime('%Y-%m-%d') if pd.notna(d) else str(d)}
+        return df.to_html(index=False, classes='tbl', border=0, justify='center', formatters=fmt)
+
+    def write_html_table(buf: io.StringIO, df: pd.DataFrame) -> None:
+        # small tables go through to_html; large ones are written row by row so the
+        # full table never exists as a separate string next to the report buffer
+        if len(df) <= REPORT_STREAM_ROWS:
+            buf.write(df_to_html_table(df))
+            return
+        buf.write('<table class="dataframe tbl">\n  <thead>\n    <tr style="text-align: center;">\n')
+        for c in df.columns:
+            buf.write(f"      <th>{html.escape(str(c))}</th>\n")
+        buf.write("    </tr>\n  </thead>\n  <tbody>\n")
+        for row in df.itertuples(index=False, name=None):
+            buf.write("    <tr>\n")
+            for v in row:
+                v = v.strftime('%Y-%m-%d') if isinstance(v, pd.Timestamp) else v
+                buf.write(f"      <td>{html.escape(str(v))}</td>\n")
+            buf.write("    </tr>\n")
+        buf.write("  </tbody>\n</table>")
 
     def make_farm_report_html(farm_name: str) -> bytes:
-        sub = rep.copy().sort_values(['Disease','Test_Date','Sample_ID'])
+        sub = rep_view
         total = len(sub)
-        pos_cnt = int(sub['is_positive'].sum())
-        neg_cnt = int((sub['Result'] == 'Negative').sum())
-        rea_cnt = int((sub['Result'].str.lower() == 're-analysis').sum())
+        pos_cnt, neg_cnt, rea_cnt = _result_counts(sub)
         rate = (pos_cnt/total*100.0) if total else 0.0
-        last_date = sub['Test_Date'].max()
+        last_date = sub['Test_Date'].max().date()
 
         logo_html = f"<img src='data:image/jpeg;base64,{logo_b64}' width='80'/>" if logo_b64 else "<b>CJ F&C</b>"
         summary_rows = [
@@ -494,10 +681,8 @@ if rep_farm:
         ]
         summary_html = "".join([f"<tr><td>{k}</td><td>{v}</td></tr>" for k,v in summary_rows])
 
-        pivot_html = df_to_html_table(pivot)
-        table_html = df_to_html_table(sub[view_cols])
-
-        html = f"""
+        buf = io.StringIO()
+        buf.write(f"""
         <html>
         <head>
           <meta charset='utf-8'/>
@@ -526,18 +711,22 @@ if rep_farm:
             </div>
             <div class='card'>
               <b>By Disease</b>
-              <div style='margin-top:8px;'>{pivot_html}</div>
+              <div style='margin-top:8px;'>""")
+        write_html_table(buf, pivot)
+        buf.write("""</div>
             </div>
           </div>
           <div class='card'>
             <b>Details</b>
-            <div style='margin-top:8px;'>{table_html}</div>
+            <div style='margin-top:8px;'>""")
+        write_html_table(buf, sub)
+        buf.write("""</div>
           </div>
           <div class='foot'>Note: CT≲30 strong positive, 33–36 borderline (re-test). 'No Ct' recorded as negative.</div>
         </body>
         </html>
-        """
-        return html.encode('utf-8')
+        """)
+        return buf.getvalue().encode('utf-8')
 
     html_bytes = make_farm_report_html(rep_farm)
     st.download_button(
@@ -553,7 +742,6 @@ if rep_farm:
 # ----------------------------------------------------
 st.divider()
 st.subheader("Filtered Data")
-show_cols = ['number','Sample_ID','Specie','Farm_Name','Disease','Test_Date','CT_Value','Result']
-st.dataframe(fdf[show_cols], use_container_width=True, hide_index=True)
+st.dataframe(display_df, use_container_width=True, hide_index=True, column_config=COLUMN_CONFIG)
 
 st.markdown("<div class='footnote'>© CJ Feed & Care — Diagnostics Dashboard</div>", unsafe_allow_html=True)